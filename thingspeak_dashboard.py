@@ -1,77 +1,177 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
+import numpy as np
+import orjson
 import requests
-from datetime import datetime, timedelta
-from pytz import UTC
-from PIL import Image
 from streamlit_option_menu import option_menu
-from plotly.subplots import make_subplots
 
 # Use Streamlit secrets for ThingSpeak credentials
 CHANNEL_ID = st.secrets["thingspeak"]["channel_id"]
 READ_API_KEY = st.secrets["thingspeak"]["read_api_key"]
 
-# Define the timezone offset
-TZ_OFFSET = timedelta(hours=-3)  # UTC-3
+# Local timezone of the sensors (UTC-3, no DST)
+TIMEZONE = 'America/Recife'
 
-def fetch_data():
+# (column, subplot title, axis label, color) for each plotted sensor
+SENSORS = [
+    ('field1', 'Sensor 1', 'Temperature Sensor 1 (°C)', 'red'),
+    ('field2', 'Sensor 2', 'Temperature Sensor 2 (°C)', 'blue'),
+]
+
+# Readings are stored as int16 hundredths of a degree, well within the DS18B20's 0.0625 °C resolution
+TEMP_SCALE = 100
+MISSING_READING = np.iinfo(np.int16).min
+MAX_ABS_READING = np.iinfo(np.int16).max // TEMP_SCALE  # Largest °C magnitude that fits once scaled
+
+# Max points per trace sent to the browser; more than this collide on the same pixel column
+PLOT_POINTS = 2000
+
+def quantize(col):
+    """Cast a string reading column to int16 hundredths of a degree, missing readings as MISSING_READING."""
+    import polars as pl
+    
+    x = col.cast(pl.Float32, strict=False)
+    # "nan", "inf" or readings beyond the int16 range become missing instead of failing the cast
+    x = pl.when(x.is_finite() & (x.abs() <= MAX_ABS_READING)).then(x)
+    return (x * TEMP_SCALE).round(0).cast(pl.Int16).fill_null(MISSING_READING)
+
+def celsius(a):
+    """Decode quantized readings back to float °C, with NaN for missing readings."""
+    return np.where(a == MISSING_READING, np.nan, a / TEMP_SCALE).astype('float32')
+
+def extremes(a):
+    """Return (min, argmin, max, argmax) of a quantized column skipping missing readings, or None if all are missing."""
+    valid = np.flatnonzero(a != MISSING_READING)
+    if not valid.size:
+        return None
+    v = a[valid]
+    imin, imax = valid[v.argmin()], valid[v.argmax()]
+    return a[imin], imin, a[imax], imax
+
+# Streamlit re-executes module scope on every rerun, so the pooled keep-alive
+# session lives in the resource cache to reuse the TLS handshake across reruns
+@st.cache_resource
+def get_session():
+    session = requests.Session()
+    session.headers.update({'Accept-Encoding': 'gzip'})
+    return session
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_data(channel_id, results=15000):
+    """Fetch the ThingSpeak feed; returns a (df, error) tuple so the cached call stays pure."""
+    # Imported here so pages without the Home tab don't pay Polars' import time
+    import polars as pl
+    
     try:
-        url = f"https://api.thingspeak.com/channels/{CHANNEL_ID}/feeds.json?api_key={READ_API_KEY}&results=15000"
-        response = requests.get(url)
+        url = f"https://api.thingspeak.com/channels/{channel_id}/feeds.json?api_key={READ_API_KEY}&results={results}&timezone={TIMEZONE}"
+        response = get_session().get(url, timeout=10)
         response.raise_for_status()  # Raises an HTTPError for bad responses
-        data = response.json()
+        data = orjson.loads(response.content)
         
-        df = pd.DataFrame(data['feeds'])
-        df['created_at'] = pd.to_datetime(df['created_at'], utc=True)
-        df['created_at'] = df['created_at'] + TZ_OFFSET  # Adjust for UTC-3
-        df['field1'] = pd.to_numeric(df['field1'], errors='coerce')  # Temperature Sensor 1
-        df['field2'] = pd.to_numeric(df['field2'], errors='coerce')  # Temperature Sensor 2
+        # Coerce in Polars (one native pass per column); ThingSpeak sends fields as strings,
+        # null or "" when a sensor skipped a reading, which the non-strict cast turns into nulls
+        feeds = pl.from_dicts(data['feeds'], schema={'created_at': pl.Utf8, 'field1': pl.Utf8, 'field2': pl.Utf8})
+        feeds = feeds.with_columns([
+            # Timestamps normally arrive in local time (2024-01-01T07:00:00-03:00), but fall back
+            # to UTC "Z" stamps (2024-01-01T10:00:00Z) if ThingSpeak ignores the timezone parameter
+            pl.col('created_at').str.replace(r'Z$', '+00:00')
+                .str.to_datetime('%Y-%m-%dT%H:%M:%S%z', time_zone='UTC').dt.convert_time_zone(TIMEZONE),
+            quantize(pl.col('field1')),  # Temperature Sensor 1
+            quantize(pl.col('field2')),  # Temperature Sensor 2
+        ])
+        df = feeds.to_pandas()
         
-        # Sort the dataframe by date
-        df = df.sort_values('created_at')
+        # ThingSpeak already returns feeds in ascending order; only sort if that ever changes
+        if not df['created_at'].is_monotonic_increasing:
+            df = df.sort_values('created_at', kind='stable', ignore_index=True)
         
-        return df
+        return df, None
     except requests.exceptions.RequestException as e:
-        st.error(f"Error fetching data from ThingSpeak: {e}")
-        return pd.DataFrame()
+        return pd.DataFrame(), f"Error fetching data from ThingSpeak: {e}"
     except KeyError as e:
-        st.error(f"Error processing ThingSpeak data: {e}")
-        return pd.DataFrame()
+        return pd.DataFrame(), f"Error processing ThingSpeak data: {e}"
     except Exception as e:
-        st.error(f"An unexpected error occurred: {e}")
-        return pd.DataFrame()
+        return pd.DataFrame(), f"An unexpected error occurred: {e}"
 
-def create_plot(df, y_col, title, y_label, color):
-    fig = make_subplots(rows=1, cols=1, subplot_titles=[title])
+def downsample(x, y, n_out=PLOT_POINTS):
+    """Reduce a trace to n_out points with LTTB, keeping its visual shape."""
+    from tsdownsample import LTTBDownsampler
     
-    fig.add_trace(
-        go.Scatter(
-            x=df['created_at'], 
-            y=df[y_col], 
-            mode='lines', 
-            name=y_label, 
-            line=dict(color=color, width=2),
-            fill='tozeroy'
-        )
-    )
+    valid = ~np.isnan(y)
+    x, y = x[valid], y[valid]
+    if len(y) <= n_out:
+        return x, y
+    idx = LTTBDownsampler().downsample(x.view('int64'), y, n_out=n_out)
+    return x[idx], y[idx]
+
+@st.cache_data(show_spinner=False)
+def load_logo():
+    # Cache the encoded PNG bytes; st.image serves them as-is without a PIL round-trip
+    with open("Logo e-Civil.png", "rb") as f:
+        return f.read()
+
+@st.cache_resource
+def import_plotly():
+    """Import Plotly lazily so the Setup/Code/Contact pages don't pay its import time.
+
+    Also pins Plotly's process-wide JSON engine to orjson, which Streamlit's
+    plotly.io.to_json call picks up; the resource cache makes this run once.
+    """
+    import plotly.graph_objects as go
+    import plotly.io as pio
+    from plotly.subplots import make_subplots
+    
+    pio.json.config.default_engine = 'orjson'
+    return go, make_subplots
+
+def create_plot(df, sensors):
+    """Plot each (y_col, title, y_label, color) sensor in its own row of one figure sharing the time axis."""
+    go, make_subplots = import_plotly()
+    
+    # The grid only lays out axes; the traces are attached afterwards without validation
+    grid = make_subplots(rows=len(sensors), cols=1, shared_xaxes=True, vertical_spacing=0.08,
+                         subplot_titles=[title for _, title, _, _ in sensors])
     
-    fig.update_layout(
-        height=400,
+    # Plot wall-clock UTC-3 times; the frame holds tz-aware timestamps
+    ts = df['created_at'].dt.tz_localize(None).to_numpy()
+    
+    traces = []
+    for row, (y_col, _, y_label, color) in enumerate(sensors, start=1):
+        x, y = downsample(ts, celsius(df[y_col].to_numpy()))
+        axis = '' if row == 1 else str(row)
+        traces.append({
+            'type': 'scattergl',
+            'x': x,
+            'y': y,
+            'mode': 'lines',
+            'name': y_label,
+            'line': {'color': color, 'width': 2},
+            'fill': 'tozeroy',
+            'xaxis': f'x{axis}',
+            'yaxis': f'y{axis}',
+        })
+        grid.update_yaxes(title_text=y_label, row=row, col=1)
+    
+    grid.update_layout(
+        height=400 * len(sensors),
         margin=dict(l=50, r=50, t=50, b=50),
-        xaxis_title='Time (UTC-3)',
-        yaxis_title=y_label,
         font=dict(family="Arial", size=12),
         plot_bgcolor='white',
-        xaxis=dict(showgrid=True, gridcolor='lightgrey'),
-        yaxis=dict(showgrid=True, gridcolor='lightgrey'),
+        showlegend=False,
     )
     
-    fig.update_xaxes(showline=True, linewidth=2, linecolor='black', mirror=True)
-    fig.update_yaxes(showline=True, linewidth=2, linecolor='black', mirror=True)
+    grid.update_xaxes(title_text='Time (UTC-3)', row=len(sensors), col=1)
+    grid.update_xaxes(showgrid=True, gridcolor='lightgrey', showline=True, linewidth=2, linecolor='black', mirror=True)
+    grid.update_yaxes(showgrid=True, gridcolor='lightgrey', showline=True, linewidth=2, linecolor='black', mirror=True)
     
-    return fig
+    # Trace arrays come straight from fetch_data, so per-property validation is skipped
+    return go.Figure({'data': traces, 'layout': grid.layout}, _validate=False)
+
+# Row count and last timestamp are a cheap key that is enough to identify the fetched data.
+# Only the latest figure is kept, since every new reading changes the key
+@st.cache_data(show_spinner=False, max_entries=1, hash_funcs={pd.DataFrame: lambda d: (len(d), d['created_at'].iat[-1].value)})
+def build_figure(df):
+    return create_plot(df, SENSORS)
 
 def main():
     st.set_page_config(page_title="Temperature Monitoring Dashboard", layout="wide", initial_sidebar_state="expanded")
@@ -93,8 +193,7 @@ def main():
         """, unsafe_allow_html=True)
 
     with st.sidebar:
-        img = Image.open("Logo e-Civil.png")
-        st.image(img)
+        st.image(load_logo())
         
         selected = option_menu(
             menu_title="Main Menu",
@@ -114,24 +213,31 @@ def main():
         st.title("🌡️ Monitoramento da temperatura com sensor DS18B20")
         st.subheader("Tecomat/UFPE - Monitoramento da temperatura de blocos de concreto")
 
-        df = fetch_data()
+        df, err = fetch_data(CHANNEL_ID)
+        if err:
+            st.error(err)
+            fetch_data.clear()  # Don't serve a cached failure; retry on the next rerun
 
         if not df.empty:
+            # Last two readings of both sensors as one small array: rows are (previous, current)
+            # Slice each column before stacking so only four values are copied
+            last2 = celsius(np.column_stack([df['field1'].to_numpy()[-2:], df['field2'].to_numpy()[-2:]]))
+
             col1, col2 = st.columns(2)
 
             with col1:
-                current_temp1 = df['field1'].iloc[-1]
+                current_temp1 = last2[-1, 0]
                 st.metric("Temperatura atual - Sensor 1", f"{current_temp1:.2f} °C", 
-                         f"{current_temp1 - df['field1'].iloc[-2]:.2f} °C")
-                fig_temp1 = create_plot(df, 'field1', '', 'Temperature Sensor 1 (°C)', 'red')
-                st.plotly_chart(fig_temp1, use_container_width=True, config={'displayModeBar': False})
+                         f"{current_temp1 - last2[0, 0]:.2f} °C")
 
             with col2:
-                current_temp2 = df['field2'].iloc[-1]
+                current_temp2 = last2[-1, 1]
                 st.metric("Temperatura atual - Sensor 2", f"{current_temp2:.2f} °C", 
-                         f"{current_temp2 - df['field2'].iloc[-2]:.2f} °C")
-                fig_temp2 = create_plot(df, 'field2', '', 'Temperature Sensor 2 (°C)', 'blue')
-                st.plotly_chart(fig_temp2, use_container_width=True, config={'displayModeBar': False})
+                         f"{current_temp2 - last2[0, 1]:.2f} °C")
+
+            # Both sensors in one figure: a single payload and layout pass in the browser
+            fig = build_figure(df)
+            st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
 
             # Display first and last timestamps
             col1, col2 = st.columns(2)
@@ -147,23 +253,30 @@ def main():
             with col2:
                 st.subheader("🌡️ Temperature Extremes")
                 
+                # Extremes are found on the int16 column and only scaled for display
                 # Sensor 1 extremes
                 st.write("**Sensor 1**")
-                max_temp1 = df['field1'].max()
-                min_temp1 = df['field1'].min()
-                max_temp1_time = df.loc[df['field1'].idxmax(), 'created_at']
-                min_temp1_time = df.loc[df['field1'].idxmin(), 'created_at']
-                st.error(f"Maximum: {max_temp1:.2f} °C, Recorded on {max_temp1_time.strftime('%Y-%m-%d %H:%M:%S')} UTC-3")
-                st.success(f"Minimum: {min_temp1:.2f} °C, Recorded on {min_temp1_time.strftime('%Y-%m-%d %H:%M:%S')} UTC-3")
+                stats1 = extremes(df['field1'].to_numpy())
+                if stats1 is None:
+                    st.warning("No valid readings")
+                else:
+                    min_temp1, min_idx1, max_temp1, max_idx1 = stats1
+                    max_temp1_time = df['created_at'].iat[max_idx1]
+                    min_temp1_time = df['created_at'].iat[min_idx1]
+                    st.error(f"Maximum: {max_temp1 / TEMP_SCALE:.2f} °C, Recorded on {max_temp1_time.strftime('%Y-%m-%d %H:%M:%S')} UTC-3")
+                    st.success(f"Minimum: {min_temp1 / TEMP_SCALE:.2f} °C, Recorded on {min_temp1_time.strftime('%Y-%m-%d %H:%M:%S')} UTC-3")
                 
                 # Sensor 2 extremes
                 st.write("**Sensor 2**")
-                max_temp2 = df['field2'].max()
-                min_temp2 = df['field2'].min()
-                max_temp2_time = df.loc[df['field2'].idxmax(), 'created_at']
-                min_temp2_time = df.loc[df['field2'].idxmin(), 'created_at']
-                st.error(f"Maximum: {max_temp2:.2f} °C, Recorded on {max_temp2_time.strftime('%Y-%m-%d %H:%M:%S')} UTC-3")
-                st.success(f"Minimum: {min_temp2:.2f} °C, Recorded on {min_temp2_time.strftime('%Y-%m-%d %H:%M:%S')} UTC-3")
+                stats2 = extremes(df['field2'].to_numpy())
+                if stats2 is None:
+                    st.warning("No valid readings")
+                else:
+                    min_temp2, min_idx2, max_temp2, max_idx2 = stats2
+                    max_temp2_time = df['created_at'].iat[max_idx2]
+                    min_temp2_time = df['created_at'].iat[min_idx2]
+                    st.error(f"Maximum: {max_temp2 / TEMP_SCALE:.2f} °C, Recorded on {max_temp2_time.strftime('%Y-%m-%d %H:%M:%S')} UTC-3")
+                    st.success(f"Minimum: {min_temp2 / TEMP_SCALE:.2f} °C, Recorded on {min_temp2_time.strftime('%Y-%m-%d %H:%M:%S')} UTC-3")
         else:
             st.error("No data available. Please check your ThingSpeak connection.")
 
@@ -188,8 +301,7 @@ def main():
                     data = response.json()
                     
                     df = pd.DataFrame(data['feeds'])
-                    df['created_at'] = pd.to_datetime(df['created_at'], utc=True)
-                    df['created_at'] = df['created_at'] + TZ_OFFSET
+                    df['created_at'] = pd.to_datetime(df['created_at'], utc=True).dt.tz_convert(TIMEZONE)
                     df['field1'] = pd.to_numeric(df['field1'], errors='coerce')
                     df['field2'] = pd.to_numeric(df['field2'], errors='coerce')
                     